@@ -1,12 +1,29 @@
 import os
-import time
+import csv
+import asyncio
+import shutil
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 
 import pandas as pd
-import praw
 from dotenv import load_dotenv
 
+try:
+    import aiohttp
+    import asyncpraw
+except ImportError:  # fall back to PRAW driven from a thread pool
+    asyncpraw = None
+    import praw
+    import requests
+    from requests.adapters import HTTPAdapter
+
+try:
+    import pyarrow  # optional: C++ CSV reader and Parquet export
+except ImportError:
+    pyarrow = None
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 log = logging.getLogger("reddit_pipeline")
 
@@ -27,6 +44,18 @@ REQUIRED_COLUMNS = [
     "search_query",
 ]
 
+# Read-back dtypes: low-cardinality labels as categoricals, free text as strings.
+CATEGORY_COLUMNS = ["author", "subreddit", "flair", "domain", "search_query"]
+TEXT_COLUMNS = ["title", "url", "permalink", "selftext"]
+# Columns where a blank cell means "" (HOT posts, link posts) rather than missing.
+BLANK_AS_EMPTY_COLUMNS = ["selftext", "search_query"]
+
+# Upper bound on listing requests in flight at once. With asyncpraw, the one
+# shared client's rate limiter paces them against Reddit's per-minute budget.
+# In the PRAW fallback each worker thread has its own client and limiter, so
+# pacing is per thread only and this cap is what bounds the request rate.
+MAX_CONCURRENT_REQUESTS = 8
+
 def _safe_int(x):
     try:
         return int(x) if x is not None else None
@@ -41,7 +70,7 @@ def _safe_float(x):
 
 class RedditCollector:
     # Task 1: Secure API initialization from .env (no hard-coded secrets)
-    def __init__(self, env_path: str = "reddit.env"):
+    def __init__(self, env_path: str = "reddit.env", out_path: str = "reddit_data.csv"):
         if not os.path.exists(env_path):
             raise FileNotFoundError(f"Environment file not found: {env_path}")
         load_dotenv(env_path)
@@ -57,122 +86,268 @@ class RedditCollector:
         if missing:
             raise RuntimeError(f"Missing environment variables: {', '.join(missing)}")
 
-        self.reddit = praw.Reddit(
-            client_id=client_id,
-            client_secret=client_secret,
-            user_agent=user_agent,
-        )
-        self.rows: List[Dict[str, Any]] = []
+        self._credentials = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "user_agent": user_agent,
+        }
+        # The asyncpraw client is created on first use, inside the running loop.
+        self.reddit = None
+        self._reddit_loop = None
+        # PRAW fallback: blocking listing fetches run on a lazily created thread pool.
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._praw_sessions: list = []
+        self._praw_lock = threading.Lock()
+        # Rows are streamed to a .part file as they arrive; export_csv moves it into place.
+        self.out_path = out_path
+        self._csv_path = f"{out_path}.part"
+        self._csv_fh = open(self._csv_path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._csv_fh, fieldnames=REQUIRED_COLUMNS)
+        self._writer.writeheader()
+        self._written = 0
+        self._seen: set = set()
+        self._dupes = 0
         self._hot_counts: Dict[str, int] = {}
         self._search_counts: Dict[str, int] = {}
+        # Created inside the running loop by _semaphore(); asyncio primitives bind to one loop.
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._sem_loop = None
+
+    async def close(self):
+        if not self._csv_fh.closed:
+            self._csv_fh.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            for session in self._praw_sessions:
+                session.close()
+            self._praw_sessions.clear()
+        self._sem = self._sem_loop = None
+        if self.reddit is not None:
+            await self.reddit.close()
+            self.reddit = self._reddit_loop = None
+
+    def _reopen_writer(self):
+        # Collecting again after close() or export_csv(): append to the .part file,
+        # seeding it from the exported CSV so the next export still has every row.
+        if not self._csv_fh.closed:
+            return
+        part_path = f"{self.out_path}.part"
+        if self._csv_path != part_path:
+            shutil.copyfile(self._csv_path, part_path)
+            self._csv_path = part_path
+        self._csv_fh = open(part_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._csv_fh, fieldnames=REQUIRED_COLUMNS)
+
+    # Task 3: Deduplicate on permalink (falling back to url) as posts arrive
+    def _seen_before(self, sub) -> bool:
+        key = getattr(sub, "permalink", None) or getattr(sub, "url", None)
+        if key is None:
+            return False
+        if key in self._seen:
+            self._dupes += 1
+            return True
+        self._seen.add(key)
+        return False
 
     @staticmethod
     def _row_from_submission(sub, subreddit_name: str, search_query: Optional[str]) -> Dict[str, Any]:
-        author_obj = getattr(sub, "author", None)
-        selftext = getattr(sub, "selftext", None)
-        if isinstance(selftext, str):
+        # Listing items arrive with their JSON already loaded into the instance
+        # dict; reading it directly avoids per-field __getattr__ resolution.
+        d = vars(sub)
+        author_obj = d.get("author")
+        selftext = d.get("selftext")
+        if isinstance(selftext, str) and len(selftext) > 500:
             selftext = selftext[:500]
+        is_self = bool(d.get("is_self", False))
 
-        permalink = getattr(sub, "permalink", None)
+        permalink = d.get("permalink")
         if permalink and not str(permalink).startswith("http"):
             permalink = f"https://www.reddit.com{permalink}"
 
         return {
-            "title": getattr(sub, "title", None),
-            "score": _safe_int(getattr(sub, "score", None)),
-            "upvote_ratio": _safe_float(getattr(sub, "upvote_ratio", None)),
-            "num_comments": _safe_int(getattr(sub, "num_comments", None)),
+            "title": d.get("title"),
+            "score": _safe_int(d.get("score")),
+            "upvote_ratio": _safe_float(d.get("upvote_ratio")),
+            "num_comments": _safe_int(d.get("num_comments")),
             "author": getattr(author_obj, "name", None) if author_obj else None,
             "subreddit": subreddit_name,
-            "url": getattr(sub, "url", None),
+            "url": d.get("url"),
             "permalink": permalink,
-            "created_utc": _safe_int(getattr(sub, "created_utc", None)),
-            "is_self": bool(getattr(sub, "is_self", False)),
+            "created_utc": _safe_int(d.get("created_utc")),
+            "is_self": is_self,
             "selftext": selftext,
-            "flair": getattr(sub, "link_flair_text", None),
-            "domain": getattr(sub, "domain", None),
+            "flair": d.get("link_flair_text"),
+            "domain": d.get("domain"),
             "search_query": search_query or "",
         }
 
+    def _add_submission(self, sub, subreddit_name: str, search_query: Optional[str]):
+        self._writer.writerow(self._row_from_submission(sub, subreddit_name, search_query))
+        self._written += 1
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._sem_loop is not loop:
+            self._sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            self._sem_loop = loop
+        return self._sem
+
+    def _async_reddit(self):
+        # aiohttp needs a running event loop, so this is only called from _fetch_one.
+        # The client is bound to the loop that created it; a client left over from an
+        # earlier asyncio.run() without close() cannot be used (or closed) here, so
+        # a fresh one replaces it.
+        loop = asyncio.get_running_loop()
+        if self.reddit is None or self._reddit_loop is not loop:
+            # Idle connections are kept 60s (aiohttp default: 15s) so they survive the
+            # pauses between batches; the pool is capped at MAX_CONCURRENT_REQUESTS
+            # (aiohttp default: 100).
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+            self.reddit = asyncpraw.Reddit(**self._credentials, requestor_kwargs={"session": session})
+            self._reddit_loop = loop
+        return self.reddit
+
+    def _praw_reddit(self):
+        # PRAW instances are not thread-safe, so each pool worker gets its own.
+        reddit = getattr(self._local, "reddit", None)
+        if reddit is None:
+            # Pooling only: retries and 429 handling are left to prawcore's own policy.
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+            with self._praw_lock:
+                self._praw_sessions.append(session)
+            reddit = praw.Reddit(**self._credentials, requestor_kwargs={"session": session})
+            self._local.reddit = reddit
+        return reddit
+
+    def _fetch_listing(self, name: str, query: Optional[str], limit: int) -> list:
+        subreddit = self._praw_reddit().subreddit(name)
+        listing = subreddit.search(query, limit=limit) if query else subreddit.hot(limit=limit)
+        return list(listing)
+
+    async def _fetch_one(self, sem: asyncio.Semaphore, name: str, query: Optional[str], limit: int,
+                         pause_sec: float) -> list:
+        async with sem:
+            if asyncpraw is None:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+                loop = asyncio.get_running_loop()
+                subs = await loop.run_in_executor(self._pool, self._fetch_listing, name, query, limit)
+            else:
+                subreddit = await self._async_reddit().subreddit(name)
+                listing = subreddit.search(query, limit=limit) if query else subreddit.hot(limit=limit)
+                subs = [sub async for sub in listing]
+            if pause_sec:
+                await asyncio.sleep(pause_sec)
+        return subs
+
+    async def _collect(self, subreddits: List[str], query: Optional[str], limit: int, pause_sec: float) -> List[Tuple[str, Any]]:
+        # One coroutine per subreddit; each returns its own list so rows are
+        # stored afterwards in subreddit order without shared-state locking.
+        sem = self._semaphore()
+        tasks = [self._fetch_one(sem, name, query, limit, pause_sec) for name in subreddits]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return list(zip(subreddits, results))
+
     # Task 2a: Fetch HOT posts for several subreddits
-    def fetch_hot_posts(self, subreddits: List[str], limit_per_sub: int = 50, pause_sec: float = 0.0):
+    async def fetch_hot_posts(self, subreddits: List[str], limit_per_sub: int = 50, pause_sec: float = 0.0):
         total = 0
+        self._reopen_writer()
+        seen_before, add = self._seen_before, self._add_submission
         for name in subreddits:
-            count = 0
-            log.info(f"Collecting HOT posts from r/{name} (limit={limit_per_sub})")
-            try:
-                for sub in self.reddit.subreddit(name).hot(limit=limit_per_sub):
-                    self.rows.append(self._row_from_submission(sub, name, search_query=None))
-                    count += 1
-                    total += 1
-                self._hot_counts[name] = count
-                if pause_sec:
-                    time.sleep(pause_sec)
-            except Exception as e:
-                log.warning(f"Skipping r/{name} due to error: {e}")
+            log.info("Collecting HOT posts from r/%s (limit=%d)", name, limit_per_sub)
+        for name, result in await self._collect(subreddits, None, limit_per_sub, pause_sec):
+            if isinstance(result, Exception):
+                log.warning("Skipping r/%s due to error: %s", name, result)
                 self._hot_counts[name] = 0
-        log.info(f"Collected {total} HOT posts.")
+                continue
+            for sub in result:
+                if not seen_before(sub):
+                    add(sub, name, None)
+            self._hot_counts[name] = len(result)
+            total += len(result)
+        log.info("Collected %d HOT posts.", total)
 
     # Task 2b: Keyword-based search with provenance in search_query
-    def search_posts(self, query: str, subreddits: List[str], limit_per_sub: int = 50, pause_sec: float = 0.0):
+    async def search_posts(self, query: str, subreddits: List[str], limit_per_sub: int = 50, pause_sec: float = 0.0):
         total = 0
+        self._reopen_writer()
+        seen_before, add = self._seen_before, self._add_submission
         for name in subreddits:
-            count = 0
-            log.info(f'Searching r/{name} for "{query}" (limit={limit_per_sub})')
-            try:
-                for sub in self.reddit.subreddit(name).search(query, limit=limit_per_sub):
-                    self.rows.append(self._row_from_submission(sub, name, search_query=query))
-                    count += 1
-                    total += 1
-                self._search_counts[name] = count
-                if pause_sec:
-                    time.sleep(pause_sec)
-            except Exception as e:
-                log.warning(f'Search failed for r/{name} (query="{query}"): {e}')
+            log.info('Searching r/%s for "%s" (limit=%d)', name, query, limit_per_sub)
+        for name, result in await self._collect(subreddits, query, limit_per_sub, pause_sec):
+            if isinstance(result, Exception):
+                log.warning('Search failed for r/%s (query="%s"): %s', name, query, result)
                 self._search_counts[name] = 0
-        log.info(f'Search collected {total} posts.')
+                continue
+            for sub in result:
+                if not seen_before(sub):
+                    add(sub, name, query)
+            self._search_counts[name] = len(result)
+            total += len(result)
+        log.info('Search collected %d posts.', total)
 
     def to_dataframe(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.rows) if self.rows else pd.DataFrame(columns=REQUIRED_COLUMNS)
-        for col in REQUIRED_COLUMNS:
-            if col not in df.columns:
-                df[col] = pd.NA
-        return df[REQUIRED_COLUMNS]
-
-    # Task 3: Deduplicate and export to CSV without index
-    def export_csv(self, out_path: str = "reddit_data.csv") -> pd.DataFrame:
+        if not self._csv_fh.closed:
+            self._csv_fh.flush()
+        engine = "pyarrow" if pyarrow is not None else "c"
+        dtypes = {c: "category" for c in CATEGORY_COLUMNS}
+        dtypes.update({c: "string[pyarrow]" if pyarrow is not None else "string" for c in TEXT_COLUMNS})
+        df = pd.read_csv(self._csv_path, engine=engine, dtype=dtypes,
+                         keep_default_na=False, na_values=[""])
+        for c in BLANK_AS_EMPTY_COLUMNS:
+            col = df[c]
+            if isinstance(col.dtype, pd.CategoricalDtype) and "" not in col.cat.categories:
+                col = col.cat.add_categories("")
+            df[c] = col.fillna("")
+        return df
+
+    # Task 3: Export to CSV without index (duplicates were skipped on insert)
+    def export_csv(self, out_path: Optional[str] = None) -> pd.DataFrame:
+        out_path = out_path or self.out_path
+        if not self._csv_fh.closed:
+            self._csv_fh.close()
+        if os.path.abspath(out_path) == os.path.abspath(self.out_path):
+            if self._csv_path != out_path:
+                os.replace(self._csv_path, out_path)
+                self._csv_path = out_path
+        else:
+            # Extra copies elsewhere (possibly another filesystem) leave our own file in place.
+            shutil.copyfile(self._csv_path, out_path)
+        if self._dupes > 0:
+            log.info("Deduplicated %d row(s).", self._dupes)
+        log.info("Saved %d rows to %s.", self._written, out_path)
         df = self.to_dataframe()
-        before = len(df)
-        if "permalink" in df.columns and df["permalink"].notna().any():
-            df = df.drop_duplicates(subset=["permalink"], keep="first")
-        elif "url" in df.columns and df["url"].notna().any():
-            df = df.drop_duplicates(subset=["url"], keep="first")
-        removed = before - len(df)
-        if removed > 0:
-            log.info(f"Deduplicated {removed} row(s).")
-        df.to_csv(out_path, index=False)
-        log.info(f"Saved {len(df)} rows to {out_path}.")
+        if pyarrow is not None:
+            parquet_path = os.path.splitext(out_path)[0] + ".parquet"
+            df.to_parquet(parquet_path, engine="pyarrow", compression="zstd", index=False)
+            log.info("Saved %d rows to %s.", len(df), parquet_path)
         return df
 
     def print_summary(self, df: Optional[pd.DataFrame] = None):
         if df is None:
             df = self.to_dataframe()
         subs = sorted([s for s in df["subreddit"].dropna().unique()])
-        log.info(f"Total unique subreddits: {len(subs)}")
+        log.info("Total unique subreddits: %d", len(subs))
         for s in subs:
-            log.info(f" - {s}")
+            log.info(" - %s", s)
         if self._hot_counts:
             log.info("HOT counts by subreddit:")
             for k, v in self._hot_counts.items():
-                log.info(f" - r/{k}: {v}")
+                log.info(" - r/%s: %d", k, v)
         if self._search_counts:
             log.info("SEARCH counts by subreddit:")
             for k, v in self._search_counts.items():
-                log.info(f" - r/{k}: {v}")
-        log.info(f"Rows collected (memory): {len(self.rows)}")
-        log.info(f"Rows in DataFrame: {len(df)}")
+                log.info(" - r/%s: %d", k, v)
+        log.info("Rows written: %d", self._written)
+        log.info("Rows in DataFrame: %d", len(df))
 
-if __name__ == "__main__":
+async def main():
     SUBS = [
         "netflix",
         "movies",
@@ -189,9 +364,21 @@ if __name__ == "__main__":
         '(ad tier OR ads OR advertising) AND Netflix',
     ]
 
-    collector = RedditCollector(env_path="reddit.env")
-    collector.fetch_hot_posts(SUBS, limit_per_sub=50, pause_sec=0.5)
-    for q in QUERIES:
-        collector.search_posts(q, SUBS, limit_per_sub=30, pause_sec=0.5)
-    df = collector.export_csv(out_path="reddit_data.csv")
+    collector = RedditCollector(env_path="reddit.env", out_path="reddit_data.csv")
+    try:
+        await collector.fetch_hot_posts(SUBS, limit_per_sub=50, pause_sec=0.5)
+        for q in QUERIES:
+            await collector.search_posts(q, SUBS, limit_per_sub=30, pause_sec=0.5)
+    finally:
+        await collector.close()
+    df = collector.export_csv()
     collector.print_summary(df)
+
+if __name__ == "__main__":
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(main())
+    else:
+        # Colab/Jupyter already run an event loop, so asyncio.run() would fail there.
+        log.warning("An event loop is already running (notebook?). Run `await main()` in a cell instead.")